@@ -1,24 +1,49 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Body
+from fastapi.responses import Response
 import uvicorn
 from decouple import config
 from pynfe.processamento.comunicacao import ComunicacaoSefaz
 import os
+import time
+import asyncio
+import io
+import threading
 import shutil
 from pathlib import Path
 from typing import Optional
+from collections import namedtuple
+from contextlib import asynccontextmanager, suppress
+from itertools import islice
 from lxml import etree
+import re
 import requests
-import base64
-import gzip
+import binascii
+import zlib
 from pydantic import BaseModel
+import orjson
 
-app = FastAPI(title="QuickSign SefazBridge")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Resolve o certificado (upload ou .env) na subida, deixando a configuração em cache para a primeira consulta"""
+    # O mesmo certificado atende todas as UFs (a UF vem da chave), então basta uma configuração
+    get_certificate_config()
+    yield
+
+# Os endpoints declaram o tipo de retorno (-> dict): com ele o FastAPI serializa a resposta
+# direto para bytes JSON pelo Pydantic, sem o jsonable_encoder e sem classe de resposta própria
+app = FastAPI(title="QuickSign SefazBridge", lifespan=lifespan)
 
 # Diretório para armazenar certificados enviados
 CERTIFICATES_DIR = Path("certificates")
 CERTIFICATES_DIR.mkdir(exist_ok=True)
 
+# Tamanho do bloco usado ao gravar arquivos enviados em disco
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# XMLs enviados como arquivo são lidos em blocos de 64 KiB, até o tamanho máximo aceito
+XML_READ_CHUNK_SIZE = 64 * 1024
+MAX_XML_UPLOAD_SIZE = config('MAX_XML_UPLOAD_SIZE', default=10 * 1024 * 1024, cast=int)
+
 # Armazenamento em memória das configurações do certificado
 # Em produção, considere usar um banco de dados ou arquivo de configuração seguro
 certificate_config = {
@@ -36,6 +61,9 @@ UF_RAW = config('UF', default='MG')
 UF = UF_RAW.split('#')[0].strip() if UF_RAW else 'MG'  # Remove comentários
 HOMOLOGACAO = config('HOMOLOGACAO', default=False, cast=bool)
 
+# Processos do servidor ao rodar com `python main.py` (padrão: 1)
+WORKERS = config('WORKERS', default=1, cast=int)
+
 # Mapeamento de códigos UF (IBGE) para siglas
 CODIGOS_UF = {
     '11': 'RO', '12': 'AC', '13': 'AM', '14': 'RR', '15': 'PA',
@@ -46,6 +74,128 @@ CODIGOS_UF = {
     '52': 'GO', '53': 'DF'
 }
 
+# Siglas aceitas no upload do certificado (frozenset: busca O(1))
+# A mensagem de erro é montada uma única vez, e não a cada requisição inválida
+_SIGLAS_UF = ('AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA',
+              'MT', 'MS', 'MG', 'PA', 'PB', 'PR', 'PE', 'PI', 'RJ', 'RN',
+              'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO')
+UFS_VALIDAS = frozenset(_SIGLAS_UF)
+UFS_VALIDAS_MSG = f"UF inválida. Use uma das siglas válidas: {', '.join(_SIGLAS_UF)}"
+
+# Tabela para str.translate que remove tudo que não for dígito (ex.: pontuação do CPF/CNPJ)
+# A remoção é feita em C, sem chamar uma função Python para cada caractere
+STRIP_NON_DIGITS = str.maketrans('', '', ''.join(ch for ch in map(chr, range(128)) if not ch.isdigit()))
+
+def digits_only(text: str) -> str:
+    """Mantém só os dígitos do texto (CPF/CNPJ, chave de acesso)"""
+    digits = text.translate(STRIP_NON_DIGITS)
+    if not digits.isascii():
+        # A tabela cobre só ASCII; o que sobrar de fora dela (ex.: travessão, 'º') passa pelo filtro completo
+        digits = ''.join(filter(str.isdigit, digits))
+    return digits
+
+# Namespace padrão da NF-e
+NFE_NAMESPACE = 'http://www.portalfiscal.inf.br/nfe'
+NFE_NS = {'ns': NFE_NAMESPACE}
+
+# Campos lidos do destinatário (dest) e do seu endereço (enderDest)
+DEST_FIELDS = frozenset({'xNome', 'CNPJ', 'CPF', 'xLgr', 'nro', 'xCpl', 'xBairro', 'xMun', 'UF'})
+# CNPJ e CPF são alternativos (o destinatário tem um ou outro): com todos os campos presentes, são lidos len - 1
+DEST_FIELDS_EXPECTED = len(DEST_FIELDS) - 1
+
+# Tags de status das respostas da SEFAZ (local-name -> campo), incluindo as variações de caixa
+STATUS_TAGS = {'cStat': 'cStat', 'cstat': 'cStat', 'xMotivo': 'xMotivo', 'xmotivo': 'xMotivo', 'xMsg': 'xMsg'}
+
+# Filtro de tags de status para iter()/iterparse(), em qualquer namespace ('{*}')
+# O lxml compara as tags em C e só entrega ao Python os elementos que casam
+STATUS_ITER_TAGS = tuple('{*}' + tag for tag in STATUS_TAGS)
+
+# Tags lidas na passada única sobre a resposta da distribuição DF-e (status, motivo e docZip), em qualquer namespace
+DIST_SCAN_TAGS = STATUS_ITER_TAGS + ('{*}docZip',)
+
+def local_name(tag: str) -> str:
+    """Retorna a tag sem o namespace ('{uri}xNome' -> 'xNome') sem criar listas intermediárias"""
+    return tag[tag.rfind('}') + 1:]
+
+# Expressões XPath pré-compiladas no carregamento do módulo
+# Evita que o lxml faça o parse/compilação da expressão a cada requisição
+# A busca principal usa o prefixo do namespace da NF-e (nomes comparados em C pelo lxml);
+# as versões por local-name() (sufixo _ANY) funcionam com ou sem namespace, mas testam uma
+# string em cada nó da árvore, então só rodam quando a principal não encontra nada
+def local_name_path(*tags: str) -> str:
+    """Monta um caminho XPath que casa cada tag pelo local-name (ignora namespace)"""
+    return '//' + '/'.join(f'*[local-name()="{tag}"]' for tag in tags)
+
+# dest e vNF são buscados a partir do nó de contexto ('.//'), para que a busca funcione também
+# em um elemento NFe dentro de uma resposta maior, sem olhar o restante do documento
+XP_DEST = etree.XPath('(.//ns:dest)[1]', namespaces=NFE_NS)
+XP_DEST_ANY = etree.XPath('(.' + local_name_path('dest') + ')[1]')
+XP_VNF = etree.XPath('.//ns:total/ns:ICMSTot/ns:vNF/text()', namespaces=NFE_NS)
+XP_VNF_ANY = etree.XPath('.' + local_name_path('total', 'ICMSTot', 'vNF') + '/text()')
+XP_VNF_ANYWHERE = etree.XPath('.//ns:vNF/text()', namespaces=NFE_NS)
+XP_VNF_ANYWHERE_ANY = etree.XPath('.' + local_name_path('vNF') + '/text()')
+XP_CHNFE = etree.XPath('//ns:chNFe/text()', namespaces=NFE_NS)
+XP_CHNFE_ANY = etree.XPath(local_name_path('chNFe') + '/text()')
+# Id do infNFe (ou, no fallback, de qualquer elemento) no formato "NFe" + chave de acesso
+XP_NFE_ID = etree.XPath('//ns:infNFe/@Id[starts-with(., "NFe")]', namespaces=NFE_NS)
+XP_NFE_ID_ANY = etree.XPath('//@Id[starts-with(., "NFe")]')
+# Texto de todos os docZip em uma única passada
+XP_DOCZIP = etree.XPath('//ns:docZip/text()', namespaces=NFE_NS)
+XP_DOCZIP_ANY = etree.XPath(local_name_path('docZip') + '/text()')
+XP_NFE = etree.XPath('//ns:NFe', namespaces=NFE_NS)
+XP_NFE_ANY = etree.XPath(local_name_path('NFe'))
+XP_NFE_PROC = etree.XPath('(' + local_name_path('nfeProc') + ')[1]')
+
+# docZip da distribuição DF-e: base64 de um stream gzip (wbits 16 + MAX_WBITS aceita o cabeçalho gzip)
+DOCZIP_WBITS = 16 + zlib.MAX_WBITS
+# Assinatura dos dois primeiros bytes de um stream gzip
+GZIP_MAGIC = b'\x1f\x8b'
+
+def decode_doczip(doc_zip_text) -> bytes:
+    """
+    Decodifica o conteúdo de um docZip com uma única chamada ao zlib (sem o GzipFile do módulo gzip).
+    
+    O base64 é decodificado uma vez só; se o conteúdo não for gzip (sem a assinatura), é retornado como está.
+    O texto do lxml é passado direto ao binascii, que lê a str ASCII sem a cópia de encode('ascii')
+    feita pelo base64.b64decode e já ignora espaços e quebras de linha (dispensa o strip()).
+    """
+    raw = binascii.a2b_base64(doc_zip_text)
+    if raw[:2] != GZIP_MAGIC:
+        return raw
+    return zlib.decompress(raw, DOCZIP_WBITS)
+
+def first_text(nodes: list) -> Optional[str]:
+    """Retorna o primeiro resultado (sem espaços nas pontas) de uma XPath que termina em text()"""
+    return nodes[0].strip() if nodes else None
+
+def find_status(root) -> tuple:
+    """
+    Lê cStat e xMotivo (ou xMsg, na falta dele) de uma resposta da SEFAZ em uma única passada.
+    
+    Fica com a primeira ocorrência de cada tag e para assim que cStat e xMotivo foram lidos.
+    Retorna (cStat, motivo), com None no que não foi encontrado.
+    """
+    found = {}
+    for elem in root.iter(*STATUS_ITER_TAGS):
+        field = STATUS_TAGS[local_name(elem.tag)]
+        if field not in found and elem.text:
+            found[field] = elem.text.strip()
+            if 'cStat' in found and 'xMotivo' in found:
+                break
+    return found.get('cStat'), found.get('xMotivo') or found.get('xMsg')
+
+def find_nfe_key(root) -> Optional[str]:
+    """Busca a chave de acesso no chNFe (protocolo) ou no Id do infNFe (sem o prefixo 'NFe')"""
+    # Primeiro as buscas com namespace; as por local-name só quando nenhuma delas encontrou nada
+    for xp_chnfe, xp_nfe_id in ((XP_CHNFE, XP_NFE_ID), (XP_CHNFE_ANY, XP_NFE_ID_ANY)):
+        nfe_key = first_text(xp_chnfe(root))
+        if nfe_key:
+            return nfe_key
+        ids = xp_nfe_id(root)
+        if ids:
+            return ids[0].replace('NFe', '')
+    return None
+
 def detect_uf_from_key(nfe_key: str) -> str:
     """Detecta a UF a partir dos dois primeiros dígitos da chave de acesso"""
     if len(nfe_key) < 2:
@@ -53,368 +203,152 @@ def detect_uf_from_key(nfe_key: str) -> str:
     codigo_uf = nfe_key[:2]
     return CODIGOS_UF.get(codigo_uf)
 
+def format_tax_id(digits: str) -> Optional[str]:
+    """Formata CNPJ (14 dígitos) ou CPF (11 dígitos); retorna None para outros tamanhos"""
+    size = len(digits)
+    if size == 14:
+        # CNPJ: XX.XXX.XXX/XXXX-XX
+        return f"{digits[:2]}.{digits[2:5]}.{digits[5:8]}/{digits[8:12]}-{digits[12:]}"
+    if size == 11:
+        # CPF: XXX.XXX.XXX-XX
+        return f"{digits[:3]}.{digits[3:6]}.{digits[6:9]}-{digits[9:]}"
+    return None
+
+# Opções do parser usado em todos os parses com árvore
+# recover=True tolera XMLs com pequenos erros sem precisar de um segundo parse;
+# huge_tree fica desligado, mantendo os limites de segurança do libxml2 (texto e profundidade)
+# para XMLs recebidos de fora (uma NF-e tem no máximo 500 KB, bem abaixo desses limites);
+# IDs, entidades e DTD não são usados e ficam desligados,
+# nenhum recurso externo é buscado na rede e declarações de namespace repetidas são removidas
+XML_PARSER_OPTIONS = dict(
+    remove_blank_text=True,
+    recover=True,
+    collect_ids=False,
+    resolve_entities=False,
+    load_dtd=False,
+    no_network=True,
+    ns_clean=True
+)
+
+# Um parser por thread: os parses rodam em threads (asyncio.to_thread) e um XMLParser
+# do lxml não pode ser usado por duas threads ao mesmo tempo
+_parser_local = threading.local()
+
+def get_xml_parser() -> etree.XMLParser:
+    """Retorna o parser da thread atual, criado uma única vez por thread"""
+    parser = getattr(_parser_local, 'parser', None)
+    if parser is None:
+        parser = _parser_local.parser = etree.XMLParser(**XML_PARSER_OPTIONS)
+    return parser
+
+def xml_to_bytes(xml_content) -> bytes:
+    """Converte o XML para bytes uma única vez; bytes recebidos da rede são usados como estão"""
+    if isinstance(xml_content, bytes):
+        return xml_content
+    # Um BOM no início vira o BOM UTF-8 após o encode e é descartado pelo próprio lxml,
+    # então não é preciso fatiar (copiar) a string inteira só para removê-lo
+    return xml_content.encode('utf-8')
+
+# Início de um XML em bytes: BOM UTF-8 e espaços opcionais seguidos de '<' ('<?xml' incluso)
+XML_START = re.compile(rb'(?:\xef\xbb\xbf)?\s*<')
+
+def looks_like_xml(xml_bytes: bytes) -> bool:
+    """Verifica se os bytes parecem XML olhando só o início, sem copiar o conteúdo"""
+    return XML_START.match(xml_bytes) is not None
+
+def parse_nfe(xml_content) -> etree._Element:
+    """Faz o parse do XML (str ou bytes) com o parser compartilhado e retorna o elemento raiz"""
+    root = etree.fromstring(xml_to_bytes(xml_content), parser=get_xml_parser())
+    if root is None:
+        # Com recover=True o lxml retorna None quando não há nenhum elemento aproveitável
+        raise ValueError("Conteúdo fornecido não é um XML válido")
+    return root
+
+def collect_children_by_local_name(parent, names: frozenset, expected: Optional[int] = None) -> dict:
+    """
+    Percorre parent.iter() uma única vez guardando o texto da primeira ocorrência de cada tag em names.
+    
+    A comparação é feita pelo local-name (ignora namespace) e a busca termina assim
+    que expected tags (padrão: todas as de names) foram encontradas.
+    """
+    if expected is None:
+        expected = len(names)
+    found = {}
+    # O filtro por tag ('{*}' + nome) é aplicado pelo lxml em C: só os elementos
+    # procurados chegam ao loop (comentários e instruções de processamento ficam de fora)
+    for elem in parent.iter(*['{*}' + name for name in names]):
+        tag = local_name(elem.tag)
+        if tag not in found and elem.text:
+            found[tag] = elem.text.strip()
+            if len(found) == expected:
+                break
+    return found
+
+def extract_nfe_fields(root) -> dict:
+    """
+    Lê os campos do destinatário e o valor total (vNF) de uma árvore já parseada.
+    
+    Localiza o elemento dest uma única vez e percorre apenas os seus filhos,
+    retornando um dict local-name -> texto (ex.: xNome, CNPJ, xLgr, vNF).
+    """
+    dest_nodes = XP_DEST(root) or XP_DEST_ANY(root)
+    fields = collect_children_by_local_name(dest_nodes[0], DEST_FIELDS, DEST_FIELDS_EXPECTED) if dest_nodes else {}
+    
+    vnf_nodes = (XP_VNF(root) or XP_VNF_ANYWHERE(root) or
+                 XP_VNF_ANY(root) or XP_VNF_ANYWHERE_ANY(root))
+    if vnf_nodes:
+        fields['vNF'] = vnf_nodes[0].strip()
+    return fields
+
+def build_nfe_data(fields: dict) -> dict:
+    """Monta nome, endereço e CPF/CNPJ do destinatário a partir dos campos extraídos do XML"""
+    customer_name = fields.get('xNome') or None
+    tax_id = None
+    tax_id_raw = fields.get('CNPJ') or fields.get('CPF')
+    
+    # Monta o endereço
+    partes_endereco = []
+    if fields.get('xLgr'):
+        partes_endereco.append(fields['xLgr'])
+    if fields.get('nro'):
+        partes_endereco.append(f", {fields['nro']}")
+    if fields.get('xCpl'):
+        partes_endereco.append(f" - {fields['xCpl']}")
+    if fields.get('xBairro'):
+        partes_endereco.append(f" - {fields['xBairro']}")
+    if fields.get('xMun'):
+        cidade = fields['xMun']
+        if fields.get('UF'):
+            cidade += f"/{fields['UF']}"
+        partes_endereco.append(f" - {cidade}")
+    elif fields.get('UF'):
+        partes_endereco.append(f" - {fields['UF']}")
+    
+    customer_address = ''.join(partes_endereco) if partes_endereco else None
+    
+    # Formata CPF/CNPJ
+    if tax_id_raw:
+        # Remove caracteres não numéricos
+        tax_id = format_tax_id(digits_only(tax_id_raw))
+    
+    # Retorna os dados extraídos
+    return {
+        "customer_name": customer_name or "Nome não encontrado no XML",
+        "customer_address": customer_address or "Endereço não encontrado no XML",
+        "tax_id": tax_id or "00.000.000/0000-00"
+    }
+
 def extract_nfe_data_from_xml(xml_content: str) -> dict:
     """Extrai dados da NF-e a partir do XML completo (já descompactado do docZip)"""
     try:
-        # Faz parsing do XML
-        if isinstance(xml_content, str):
-            # Remove BOM se presente
-            if xml_content.startswith('\ufeff'):
-                xml_content = xml_content[1:]
-            
-            # Tenta fazer parsing
-            try:
-                root = etree.fromstring(xml_content.encode('utf-8'))
-            except:
-                # Se falhar, tenta sem encoding explícito
-                root = etree.fromstring(xml_content)
-        else:
-            root = xml_content
-        
-        # Namespace padrão da NF-e - tenta descobrir o namespace do XML
-        ns_uri = None
-        if '}' in root.tag:
-            ns_uri = root.tag.split('}')[0][1:]
+        if isinstance(xml_content, (str, bytes)):
+            # Parse da árvore em C (tolerante a erros) e buscas XPath pré-compiladas
+            fields = extract_nfe_fields(parse_nfe(xml_content))
         else:
-            # Tenta encontrar o namespace em qualquer elemento
-            for elem in root.iter():
-                if '}' in elem.tag:
-                    ns_uri = elem.tag.split('}')[0][1:]
-                    break
-        
-        # Se não encontrou namespace, usa o padrão
-        if not ns_uri:
-            ns_uri = 'http://www.portalfiscal.inf.br/nfe'
-        
-        ns = {'ns': ns_uri}
-        
-        # Tenta usar xpath primeiro (mais eficiente)
-        try:
-            # Extrai nome do destinatário usando xpath
-            customer_name_nodes = root.xpath('//ns:dest/ns:xNome/text()', namespaces=ns)
-            if not customer_name_nodes:
-                # Tenta sem namespace
-                customer_name_nodes = root.xpath('//dest/xNome/text()')
-            customer_name = customer_name_nodes[0].strip() if customer_name_nodes else None
-            
-            # Extrai CPF/CNPJ
-            tax_id_nodes = root.xpath('//ns:dest/ns:CPF/text() | //ns:dest/ns:CNPJ/text()', namespaces=ns)
-            if not tax_id_nodes:
-                # Tenta sem namespace
-                tax_id_nodes = root.xpath('//dest/CPF/text() | //dest/CNPJ/text()')
-            tax_id_raw = tax_id_nodes[0].strip() if tax_id_nodes else None
-            
-            # Extrai endereço usando xpath
-            xlgr_nodes = root.xpath('//ns:dest/ns:enderDest/ns:xLgr/text()', namespaces=ns)
-            if not xlgr_nodes:
-                xlgr_nodes = root.xpath('//dest/enderDest/xLgr/text()')
-            
-            nro_nodes = root.xpath('//ns:dest/ns:enderDest/ns:nro/text()', namespaces=ns)
-            if not nro_nodes:
-                nro_nodes = root.xpath('//dest/enderDest/nro/text()')
-            
-            xcpl_nodes = root.xpath('//ns:dest/ns:enderDest/ns:xCpl/text()', namespaces=ns)
-            if not xcpl_nodes:
-                xcpl_nodes = root.xpath('//dest/enderDest/xCpl/text()')
-            
-            xbairro_nodes = root.xpath('//ns:dest/ns:enderDest/ns:xBairro/text()', namespaces=ns)
-            if not xbairro_nodes:
-                xbairro_nodes = root.xpath('//dest/enderDest/xBairro/text()')
-            
-            xmun_nodes = root.xpath('//ns:dest/ns:enderDest/ns:xMun/text()', namespaces=ns)
-            if not xmun_nodes:
-                xmun_nodes = root.xpath('//dest/enderDest/xMun/text()')
-            
-            uf_nodes = root.xpath('//ns:dest/ns:enderDest/ns:UF/text()', namespaces=ns)
-            if not uf_nodes:
-                uf_nodes = root.xpath('//dest/enderDest/UF/text()')
-            
-            # Monta o endereço
-            partes_endereco = []
-            if xlgr_nodes:
-                partes_endereco.append(xlgr_nodes[0].strip())
-            if nro_nodes:
-                partes_endereco.append(f", {nro_nodes[0].strip()}")
-            if xcpl_nodes:
-                partes_endereco.append(f" - {xcpl_nodes[0].strip()}")
-            if xbairro_nodes:
-                partes_endereco.append(f" - {xbairro_nodes[0].strip()}")
-            if xmun_nodes:
-                cidade = xmun_nodes[0].strip()
-                if uf_nodes:
-                    cidade += f"/{uf_nodes[0].strip()}"
-                partes_endereco.append(f" - {cidade}")
-            elif uf_nodes:
-                partes_endereco.append(f" - {uf_nodes[0].strip()}")
-            
-            customer_address = ''.join(partes_endereco) if partes_endereco else None
-            
-            # Formata CPF/CNPJ
-            tax_id = None
-            if tax_id_raw:
-                # Remove caracteres não numéricos
-                doc_text = ''.join(filter(str.isdigit, tax_id_raw))
-                if len(doc_text) == 14:
-                    # Formata CNPJ: XX.XXX.XXX/XXXX-XX
-                    tax_id = f"{doc_text[:2]}.{doc_text[2:5]}.{doc_text[5:8]}/{doc_text[8:12]}-{doc_text[12:]}"
-                elif len(doc_text) == 11:
-                    # Formata CPF: XXX.XXX.XXX-XX
-                    tax_id = f"{doc_text[:3]}.{doc_text[3:6]}.{doc_text[6:9]}-{doc_text[9:]}"
-            
-            # Se conseguiu extrair pelo menos o nome, retorna os dados
-            if customer_name:
-                return {
-                    "customer_name": customer_name,
-                    "customer_address": customer_address or "Endereço não encontrado no XML",
-                    "tax_id": tax_id or "00.000.000/0000-00"
-                }
-        except Exception as xpath_error:
-            # Se xpath falhar, usa o método de busca tradicional
-            pass
-        
-        # Identifica a tag raiz e ajusta para buscar no lugar certo
-        root_tag = root.tag.split('}')[-1] if '}' in root.tag else root.tag
-        
-        # Se o root é nfeProc, busca o infNFe dentro dele
-        if root_tag == 'nfeProc':
-            # Procura pelo infNFe dentro de nfeProc > NFe > infNFe
-            inf_nfe = None
-            for elem in root.iter():
-                tag_local = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                if tag_local == 'infNFe':
-                    inf_nfe = elem
-                    break
-            if inf_nfe is not None:
-                root = inf_nfe
-        elif root_tag == 'NFe':
-            # Se o root é NFe, busca o infNFe dentro dele
-            inf_nfe = None
-            for elem in root.iter():
-                tag_local = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                if tag_local == 'infNFe':
-                    inf_nfe = elem
-                    break
-            if inf_nfe is not None:
-                root = inf_nfe
-        elif root_tag != 'infNFe':
-            # Se não é nenhum dos acima, procura pelo infNFe em qualquer lugar
-            inf_nfe = None
-            for elem in root.iter():
-                tag_local = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                if tag_local == 'infNFe':
-                    inf_nfe = elem
-                    break
-            if inf_nfe is not None:
-                root = inf_nfe
-        
-        # Função auxiliar para buscar elemento ignorando namespace
-        def find_element_any_ns(parent, tag_name):
-            """Busca elemento ignorando namespace"""
-            # Tenta com namespace explícito
-            for ns_uri in ['http://www.portalfiscal.inf.br/nfe', '']:
-                try:
-                    elem = parent.find(f'.//{{{ns_uri}}}{tag_name}' if ns_uri else f'.//{tag_name}')
-                    if elem is not None:
-                        return elem
-                except:
-                    pass
-            
-            # Tenta buscar por tag sem namespace (qualquer namespace)
-            for elem in parent.iter():
-                tag_local = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                if tag_local == tag_name:
-                    return elem
-            return None
-        
-        # Função auxiliar para buscar todos os elementos com uma tag
-        def findall_elements_any_ns(parent, tag_name):
-            """Busca todos os elementos com a tag, ignorando namespace"""
-            results = []
-            for elem in parent.iter():
-                tag_local = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                if tag_local == tag_name:
-                    results.append(elem)
-            return results
-        
-        # Extrai dados do destinatário (cliente)
-        # Procura em diferentes locais do XML
-        destinatario = None
-        
-        # Busca o elemento dest diretamente (já estamos no lugar certo ou vamos buscar)
-        # Primeiro tenta buscar diretamente no root atual
-        destinatario = find_element_any_ns(root, 'dest')
-        
-        # Se não encontrou, tenta diferentes caminhos
-        if destinatario is None:
-            search_paths = [
-                ('infNFe', 'dest'),  # Dentro de infNFe
-                ('NFe', 'infNFe', 'dest'),  # Dentro de NFe/infNFe
-                ('nfeProc', 'NFe', 'infNFe', 'dest'),  # Dentro de nfeProc/NFe/infNFe
-            ]
-            
-            # Se o root atual não é infNFe, precisa buscar de forma diferente
-            current_root = root
-            root_tag_current = current_root.tag.split('}')[-1] if '}' in current_root.tag else current_root.tag
-            
-            # Se não estamos em infNFe, volta para o root original para buscar
-            if root_tag_current != 'infNFe':
-                # Volta para o root original do XML
-                try:
-                    if isinstance(xml_content, str):
-                        original_root = etree.fromstring(xml_content.encode('utf-8'))
-                    else:
-                        original_root = etree.fromstring(str(xml_content).encode('utf-8'))
-                    current_root = original_root
-                except:
-                    current_root = root
-            
-            for path_parts in search_paths:
-                current = current_root
-                found = True
-                for part in path_parts:
-                    if part:
-                        current = find_element_any_ns(current, part)
-                        if current is None:
-                            found = False
-                            break
-                if found and current is not None:
-                    destinatario = current
-                    break
+            return extract_nfe_data_from_element(xml_content)
         
-        # Se não encontrou pelo caminho, busca diretamente por iteração
-        if destinatario is None:
-            # Busca recursiva em todo o XML pelo elemento dest
-            def find_dest_recursive(elem):
-                tag_local = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                if tag_local == 'dest':
-                    return elem
-                for child in elem:
-                    result = find_dest_recursive(child)
-                    if result is not None:
-                        return result
-                return None
-            
-            destinatario = find_dest_recursive(root)
-            
-            # Se ainda não encontrou, tenta buscar diretamente nos filhos do root
-            if destinatario is None:
-                for child in root:
-                    tag_local = child.tag.split('}')[-1] if '}' in child.tag else child.tag
-                    if tag_local == 'dest':
-                        destinatario = child
-                        break
-        
-        # Extrai nome do cliente
-        customer_name = None
-        if destinatario is not None:
-            # Tenta diferentes tags para o nome (xNome é o padrão na NF-e)
-            for tag in ['xNome', 'xNomeDest', 'nome', 'xNomeDestinatario']:
-                nome_elem = find_element_any_ns(destinatario, tag)
-                if nome_elem is not None and nome_elem.text:
-                    customer_name = nome_elem.text.strip()
-                    break
-            
-            # Se não encontrou, tenta buscar diretamente nos filhos
-            if not customer_name:
-                for child in destinatario:
-                    tag_local = child.tag.split('}')[-1] if '}' in child.tag else child.tag
-                    if tag_local in ['xNome', 'xNomeDest', 'nome'] and child.text:
-                        customer_name = child.text.strip()
-                        break
-        
-        # Extrai CNPJ/CPF do cliente
-        tax_id = None
-        if destinatario is not None:
-            # Tenta buscar CNPJ primeiro, depois CPF
-            for tag in ['CNPJ', 'CPF']:
-                doc_elem = find_element_any_ns(destinatario, tag)
-                if doc_elem is not None and doc_elem.text:
-                    doc_text = doc_elem.text.strip()
-                    # Remove caracteres não numéricos
-                    doc_text = ''.join(filter(str.isdigit, doc_text))
-                    # Valida se parece com CNPJ (14 dígitos) ou CPF (11 dígitos)
-                    if len(doc_text) == 14 or len(doc_text) == 11:
-                        tax_id = doc_text
-                        break
-            
-            # Se não encontrou, tenta buscar diretamente nos filhos
-            if not tax_id:
-                for child in destinatario:
-                    tag_local = child.tag.split('}')[-1] if '}' in child.tag else child.tag
-                    if tag_local in ['CNPJ', 'CPF'] and child.text:
-                        doc_text = ''.join(filter(str.isdigit, child.text.strip()))
-                        if len(doc_text) == 14 or len(doc_text) == 11:
-                            tax_id = doc_text
-                            break
-        
-        # Formata CNPJ/CPF se encontrado
-        if tax_id:
-            if len(tax_id) == 14:
-                # Formata CNPJ: XX.XXX.XXX/XXXX-XX
-                tax_id = f"{tax_id[:2]}.{tax_id[2:5]}.{tax_id[5:8]}/{tax_id[8:12]}-{tax_id[12:]}"
-            elif len(tax_id) == 11:
-                # Formata CPF: XXX.XXX.XXX-XX
-                tax_id = f"{tax_id[:3]}.{tax_id[3:6]}.{tax_id[6:9]}-{tax_id[9:]}"
-        
-        # Extrai endereço do cliente
-        customer_address = None
-        if destinatario is not None:
-            endereco = find_element_any_ns(destinatario, 'enderDest')
-            if endereco is None:
-                # Tenta outras variações
-                endereco = find_element_any_ns(destinatario, 'ender')
-            
-            if endereco is not None:
-                partes_endereco = []
-                # Mapeamento de tags de endereço (baseado na estrutura real do XML)
-                endereco_tags = {
-                    'xLgr': None,  # Logradouro
-                    'nro': None,   # Número
-                    'xCpl': None,  # Complemento
-                    'xBairro': None,  # Bairro
-                    'xMun': None,  # Município
-                    'UF': None,    # Estado
-                    'CEP': None    # CEP (opcional, para referência)
-                }
-                
-                for tag in endereco_tags.keys():
-                    elem = find_element_any_ns(endereco, tag)
-                    if elem is not None and elem.text:
-                        endereco_tags[tag] = elem.text.strip()
-                
-                # Monta o endereço no formato padrão brasileiro
-                if endereco_tags['xLgr']:
-                    endereco_str = endereco_tags['xLgr']
-                    
-                    # Adiciona número
-                    if endereco_tags['nro']:
-                        endereco_str += f", {endereco_tags['nro']}"
-                    
-                    # Adiciona complemento se existir
-                    if endereco_tags['xCpl']:
-                        endereco_str += f" - {endereco_tags['xCpl']}"
-                    
-                    # Adiciona bairro
-                    if endereco_tags['xBairro']:
-                        endereco_str += f" - {endereco_tags['xBairro']}"
-                    
-                    # Adiciona cidade/UF
-                    if endereco_tags['xMun']:
-                        endereco_str += f" - {endereco_tags['xMun']}"
-                        if endereco_tags['UF']:
-                            endereco_str += f"/{endereco_tags['UF']}"
-                    elif endereco_tags['UF']:
-                        endereco_str += f" - {endereco_tags['UF']}"
-                    
-                    customer_address = endereco_str
-        
-        # Retorna os dados extraídos
-        return {
-            "customer_name": customer_name or "Nome não encontrado no XML",
-            "customer_address": customer_address or "Endereço não encontrado no XML",
-            "tax_id": tax_id or "00.000.000/0000-00"
-        }
-    except Exception as e:
+        return build_nfe_data(fields)
+    except (etree.LxmlError, ValueError) as e:
         # Se houver erro no parsing, retorna dados genéricos
         return {
             "customer_name": "Erro ao extrair dados do XML",
@@ -423,8 +357,82 @@ def extract_nfe_data_from_xml(xml_content: str) -> dict:
             "parse_error": str(e)
         }
 
-def get_certificate_config():
-    """Retorna a configuração do certificado (upload ou .env)"""
+def extract_nfe_data_from_element(element: etree._Element) -> dict:
+    """Extrai dados da NF-e de um elemento já parseado (ex.: NFe da resposta da SEFAZ), sem serializar e parsear de novo"""
+    return build_nfe_data(extract_nfe_fields(element))
+
+def extract_nfe_data_and_key(xml_content) -> tuple:
+    """
+    Faz um único parse do XML para obter os dados do destinatário e a chave de acesso.
+    
+    A mesma árvore (parse tolerante a erros) serve às duas buscas.
+    Retorna (dados, chave); a chave é None quando não está no XML ou o XML não pôde ser lido.
+    """
+    try:
+        root = parse_nfe(xml_content)
+    except (etree.LxmlError, ValueError):
+        # Sem árvore (inclui texto que não pode ser codificado): extract_nfe_data_from_xml monta a resposta de erro
+        return extract_nfe_data_from_xml(xml_content), None
+    return extract_nfe_data_from_element(root), find_nfe_key(root)
+
+# Configuração do certificado já resolvida; imutável, pode ser compartilhada entre requisições
+CertConfig = namedtuple('CertConfig', 'path password uf homologacao exists')
+
+# Cache de get_certificate_config: config em memória -> (caminho, mtime, resultado)
+# Evita repetir resolve()/exists() a cada consulta; um único stat confirma que o arquivo não mudou
+_cert_cache: dict = {}
+
+def get_certificate_config() -> CertConfig:
+    """
+    Retorna a configuração do certificado (upload ou .env), reaproveitando o cache.
+    
+    O campo exists informa se o arquivo existe, para que quem chama não precise de outro stat.
+    """
+    cache_key = (certificate_config["path"], certificate_config["password"],
+                 certificate_config["uf"], certificate_config["homologacao"])
+    cached = _cert_cache.get(cache_key)
+    if cached is not None:
+        cached_path, cached_mtime, cached_config = cached
+        try:
+            if os.stat(cached_path).st_mtime == cached_mtime:
+                return cached_config
+        except OSError:
+            pass
+    
+    resolved = resolve_certificate_config()
+    try:
+        mtime = os.stat(resolved["path"]).st_mtime
+    except OSError:
+        # Só guarda no cache quando o arquivo existe; caso contrário ele é procurado de novo
+        _cert_cache.pop(cache_key, None)
+        return CertConfig(exists=False, **resolved)
+    cert_config = CertConfig(exists=True, **resolved)
+    _cert_cache[cache_key] = (cert_config.path, mtime, cert_config)
+    return cert_config
+
+# Instâncias de ComunicacaoSefaz por (certificado, senha, UF, ambiente)
+# Sem expiração: o pynfe só guarda os argumentos no construtor e lê o .pfx a cada requisição,
+# então um certificado renovado no mesmo caminho já é usado; trocas via API limpam o cache
+# O lock garante uma única instância por chave mesmo com consultas simultâneas nas threads do servidor
+_comunicacao_cache: dict = {}
+_comunicacao_lock = threading.Lock()
+
+def get_comunicacao(path: str, password: str, uf: str, homologacao: bool) -> ComunicacaoSefaz:
+    """Retorna a ComunicacaoSefaz da combinação certificado/senha/UF/ambiente, criada uma única vez"""
+    key = (path, password, uf, homologacao)
+    with _comunicacao_lock:
+        con = _comunicacao_cache.get(key)
+        if con is None:
+            con = _comunicacao_cache[key] = ComunicacaoSefaz(uf, path, password, homologacao=homologacao)
+    return con
+
+def clear_comunicacao_cache() -> None:
+    """Descarta as instâncias de ComunicacaoSefaz (certificado trocado ou removido)"""
+    with _comunicacao_lock:
+        _comunicacao_cache.clear()
+
+def resolve_certificate_config():
+    """Localiza o certificado no disco (upload ou .env)"""
     # Verifica se há certificado enviado via upload
     if certificate_config["path"]:
         # Converte para caminho absoluto e verifica se existe
@@ -482,13 +490,19 @@ def get_certificate_config():
             "homologacao": HOMOLOGACAO
         }
 
+def write_pfx(file_path: Path, source) -> None:
+    """Grava o certificado enviado em disco"""
+    with open(file_path, "wb") as buffer:
+        # Blocos de 1 MiB: poucas iterações/syscalls mesmo para arquivos de vários MB
+        shutil.copyfileobj(source, buffer, length=UPLOAD_CHUNK_SIZE)
+
 @app.post("/upload-certificate")
 async def upload_certificate(
     file: UploadFile = File(...),
     password: str = Form(...),
     uf: str = Form(...),
     homologacao: bool = Form(False)
-):
+) -> dict:
     """
     Faz upload do certificado A1 (.pfx) e configura a senha e UF.
     
@@ -506,22 +520,22 @@ async def upload_certificate(
     
     # Valida UF
     uf = uf.upper().strip()
-    ufs_validas = ['AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 
-                   'MT', 'MS', 'MG', 'PA', 'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 
-                   'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO']
-    if uf not in ufs_validas:
+    if uf not in UFS_VALIDAS:
         raise HTTPException(
             status_code=400,
-            detail=f"UF inválida. Use uma das siglas válidas: {', '.join(ufs_validas)}"
+            detail=UFS_VALIDAS_MSG
         )
     
     # Salva o arquivo (usa caminho absoluto)
     file_path = CERTIFICATES_DIR / file.filename
     file_path = file_path.resolve()  # Converte para caminho absoluto
     
+    # O arquivo pode estar sendo substituído: descarta instâncias criadas para o certificado anterior
+    clear_comunicacao_cache()
+    
+    # Gravação e validação rodam em thread para não travar o event loop durante o I/O
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await asyncio.to_thread(write_pfx, file_path, file.file)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -530,12 +544,11 @@ async def upload_certificate(
     
     # Testa se o certificado pode ser aberto com a senha fornecida
     try:
-        con = ComunicacaoSefaz(uf, str(file_path), password, homologacao=homologacao)
+        con = await asyncio.to_thread(get_comunicacao, str(file_path), password, uf, homologacao)
         # Se chegou aqui, o certificado foi aberto com sucesso
     except Exception as e:
         # Remove o arquivo se a senha estiver incorreta
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        await asyncio.to_thread(file_path.unlink, missing_ok=True)
         
         error_msg = str(e)
         if "senha" in error_msg.lower() or "password" in error_msg.lower():
@@ -555,6 +568,9 @@ async def upload_certificate(
     certificate_config["uf"] = uf
     certificate_config["homologacao"] = homologacao
     
+    _cert_cache.clear()
+    _status_cache["body"] = None
+    
     # Verifica se o arquivo realmente foi salvo
     if not file_path.exists():
         raise HTTPException(
@@ -580,191 +596,62 @@ def extract_nfe_complete_data(xml_content: str) -> dict:
     Retorna: nome, endereço, CNPJ/CPF e valor total.
     """
     try:
-        # Faz parsing do XML
-        if isinstance(xml_content, str):
-            # Remove BOM se presente
-            if xml_content.startswith('\ufeff'):
-                xml_content = xml_content[1:]
+        # Faz parsing do XML (str do JSON ou bytes recebidos direto no corpo da requisição)
+        if isinstance(xml_content, (str, bytes)):
+            xml_bytes = xml_to_bytes(xml_content)
             
-            # Valida se é XML
-            if not xml_content.strip().startswith('<?xml') and not xml_content.strip().startswith('<'):
+            # Valida se é XML (ignora o BOM UTF-8, que o lxml trata sozinho)
+            if not looks_like_xml(xml_bytes):
                 raise ValueError("Conteúdo fornecido não é um XML válido")
             
-            # Tenta fazer parsing
+            # Parse da árvore em C (tolerante a erros) e buscas XPath pré-compiladas
             try:
-                root = etree.fromstring(xml_content.encode('utf-8'))
-            except Exception as e:
-                # Se falhar, tenta sem encoding explícito
-                try:
-                    root = etree.fromstring(xml_content)
-                except:
-                    raise ValueError(f"Erro ao fazer parse do XML: {str(e)}")
+                root = parse_nfe(xml_bytes)
+            except etree.XMLSyntaxError as e:
+                raise ValueError(f"Erro ao fazer parse do XML: {str(e)}")
+            fields = extract_nfe_fields(root)
         else:
-            root = xml_content
+            fields = extract_nfe_fields(xml_content)
         
-        # Namespace padrão da NF-e - tenta descobrir o namespace do XML
-        ns_uri = None
-        if '}' in root.tag:
-            ns_uri = root.tag.split('}')[0][1:]
-        else:
-            # Tenta encontrar o namespace em qualquer elemento
-            for elem in root.iter():
-                if '}' in elem.tag:
-                    ns_uri = elem.tag.split('}')[0][1:]
-                    break
+        # Monta os dados a partir dos campos extraídos
+        tax_id = None
+        valor_total = None
+        # Nome do destinatário (xNome)
+        customer_name = fields.get('xNome') or None
         
-        # Se não encontrou namespace, usa o padrão
-        if not ns_uri:
-            ns_uri = 'http://www.portalfiscal.inf.br/nfe'
+        # CPF/CNPJ
+        tax_id_raw = fields.get('CNPJ') or fields.get('CPF')
         
-        ns = {'ns': ns_uri}
+        # Formata CPF/CNPJ
+        if tax_id_raw:
+            # Documento com tamanho inesperado é devolvido como veio no XML
+            tax_id = format_tax_id(digits_only(tax_id_raw)) or tax_id_raw
         
-        # Extrai nome do destinatário (xNome) usando lxml com namespace da NF-e
-        customer_name = None
-        try:
-            # Tenta com namespace primeiro
-            customer_name_nodes = root.xpath('//ns:dest/ns:xNome/text()', namespaces=ns)
-            if not customer_name_nodes:
-                # Tenta sem namespace
-                customer_name_nodes = root.xpath('//dest/xNome/text()')
-            if not customer_name_nodes:
-                # Tenta caminho alternativo
-                customer_name_nodes = root.xpath('//*[local-name()="dest"]/*[local-name()="xNome"]/text()')
-            
-            if customer_name_nodes:
-                customer_name = customer_name_nodes[0].strip()
-        except Exception as e:
-            # Se falhar, tenta método alternativo
-            try:
-                dest_elem = root.find('.//{http://www.portalfiscal.inf.br/nfe}dest') or root.find('.//dest')
-                if dest_elem is not None:
-                    xnome_elem = dest_elem.find('.//{http://www.portalfiscal.inf.br/nfe}xNome') or dest_elem.find('.//xNome')
-                    if xnome_elem is not None and xnome_elem.text:
-                        customer_name = xnome_elem.text.strip()
-            except:
-                pass
+        # Endereço (xLgr, nro, xBairro), já lidos na mesma passada dos demais campos
+        logradouro = fields.get('xLgr') or None
+        numero = fields.get('nro') or None
+        bairro = fields.get('xBairro') or None
         
-        # Extrai CPF/CNPJ
-        tax_id = None
-        try:
-            tax_id_nodes = root.xpath('//ns:dest/ns:CPF/text() | //ns:dest/ns:CNPJ/text()', namespaces=ns)
-            if not tax_id_nodes:
-                tax_id_nodes = root.xpath('//dest/CPF/text() | //dest/CNPJ/text()')
-            tax_id_raw = tax_id_nodes[0].strip() if tax_id_nodes else None
-            
-            # Formata CPF/CNPJ
-            if tax_id_raw:
-                doc_text = ''.join(filter(str.isdigit, tax_id_raw))
-                if len(doc_text) == 14:
-                    tax_id = f"{doc_text[:2]}.{doc_text[2:5]}.{doc_text[5:8]}/{doc_text[8:12]}-{doc_text[12:]}"
-                elif len(doc_text) == 11:
-                    tax_id = f"{doc_text[:3]}.{doc_text[3:6]}.{doc_text[6:9]}-{doc_text[9:]}"
-                else:
-                    tax_id = tax_id_raw
-        except:
-            pass
+        # Monta endereço completo a partir das partes presentes
+        completo = ''.join(parte for parte in (
+            logradouro,
+            f", {numero}" if numero else None,
+            f" - {bairro}" if bairro else None
+        ) if parte)
         
-        # Extrai endereço (xLgr, nro, xBairro) usando lxml com namespace da NF-e
         endereco_data = {
-            'logradouro': None,
-            'numero': None,
-            'bairro': None,
-            'completo': None
+            'logradouro': logradouro,
+            'numero': numero,
+            'bairro': bairro,
+            'completo': completo or None
         }
-        try:
-            # Busca o elemento enderDest primeiro
-            ender_dest = None
+        
+        # Valor total da nota (vNF); valor não numérico fica como None
+        if fields.get('vNF'):
             try:
-                ender_dest = root.find('.//{http://www.portalfiscal.inf.br/nfe}dest/{http://www.portalfiscal.inf.br/nfe}enderDest', namespaces=ns)
-                if ender_dest is None:
-                    ender_dest = root.find('.//dest/enderDest')
-                if ender_dest is None:
-                    # Tenta com xpath
-                    ender_nodes = root.xpath('//ns:dest/ns:enderDest', namespaces=ns)
-                    if ender_nodes:
-                        ender_dest = ender_nodes[0]
-            except:
+                valor_total = float(fields['vNF'])
+            except ValueError:
                 pass
-            
-            if ender_dest is not None:
-                # Extrai xLgr (logradouro)
-                xlgr_elem = ender_dest.find('.//{http://www.portalfiscal.inf.br/nfe}xLgr') or ender_dest.find('.//xLgr')
-                if xlgr_elem is not None and xlgr_elem.text:
-                    endereco_data['logradouro'] = xlgr_elem.text.strip()
-                
-                # Extrai nro (número)
-                nro_elem = ender_dest.find('.//{http://www.portalfiscal.inf.br/nfe}nro') or ender_dest.find('.//nro')
-                if nro_elem is not None and nro_elem.text:
-                    endereco_data['numero'] = nro_elem.text.strip()
-                
-                # Extrai xBairro (bairro)
-                xbairro_elem = ender_dest.find('.//{http://www.portalfiscal.inf.br/nfe}xBairro') or ender_dest.find('.//xBairro')
-                if xbairro_elem is not None and xbairro_elem.text:
-                    endereco_data['bairro'] = xbairro_elem.text.strip()
-            
-            # Se não encontrou com find, tenta com xpath
-            if not endereco_data['logradouro']:
-                xlgr_nodes = root.xpath('//ns:dest/ns:enderDest/ns:xLgr/text()', namespaces=ns)
-                if not xlgr_nodes:
-                    xlgr_nodes = root.xpath('//dest/enderDest/xLgr/text()')
-                if xlgr_nodes:
-                    endereco_data['logradouro'] = xlgr_nodes[0].strip()
-            
-            if not endereco_data['numero']:
-                nro_nodes = root.xpath('//ns:dest/ns:enderDest/ns:nro/text()', namespaces=ns)
-                if not nro_nodes:
-                    nro_nodes = root.xpath('//dest/enderDest/nro/text()')
-                if nro_nodes:
-                    endereco_data['numero'] = nro_nodes[0].strip()
-            
-            if not endereco_data['bairro']:
-                xbairro_nodes = root.xpath('//ns:dest/ns:enderDest/ns:xBairro/text()', namespaces=ns)
-                if not xbairro_nodes:
-                    xbairro_nodes = root.xpath('//dest/enderDest/xBairro/text()')
-                if xbairro_nodes:
-                    endereco_data['bairro'] = xbairro_nodes[0].strip()
-            
-            # Monta endereço completo
-            partes = []
-            if endereco_data['logradouro']:
-                partes.append(endereco_data['logradouro'])
-            if endereco_data['numero']:
-                partes.append(f", {endereco_data['numero']}")
-            if endereco_data['bairro']:
-                partes.append(f" - {endereco_data['bairro']}")
-            
-            endereco_data['completo'] = ''.join(partes) if partes else None
-        except Exception as e:
-            # Log do erro para debug (pode ser removido em produção)
-            pass
-        
-        # Extrai valor total da nota (vNF) usando lxml com namespace da NF-e
-        valor_total = None
-        try:
-            # Tenta caminho completo primeiro
-            vnf_nodes = root.xpath('//ns:total/ns:ICMSTot/ns:vNF/text()', namespaces=ns)
-            if not vnf_nodes:
-                vnf_nodes = root.xpath('//total/ICMSTot/vNF/text()')
-            if not vnf_nodes:
-                # Tenta outros caminhos possíveis
-                vnf_nodes = root.xpath('//ns:vNF/text()', namespaces=ns)
-            if not vnf_nodes:
-                vnf_nodes = root.xpath('//vNF/text()')
-            
-            if vnf_nodes:
-                valor_total = float(vnf_nodes[0].strip())
-            else:
-                # Tenta método alternativo com find
-                try:
-                    total_elem = root.find('.//{http://www.portalfiscal.inf.br/nfe}total/{http://www.portalfiscal.inf.br/nfe}ICMSTot/{http://www.portalfiscal.inf.br/nfe}vNF')
-                    if total_elem is None:
-                        total_elem = root.find('.//total/ICMSTot/vNF')
-                    if total_elem is not None and total_elem.text:
-                        valor_total = float(total_elem.text.strip())
-                except:
-                    pass
-        except Exception as e:
-            pass
         
         # Valida se encontrou pelo menos o nome do destinatário
         # Se não encontrou, retorna erro claro
@@ -778,13 +665,23 @@ def extract_nfe_complete_data(xml_content: str) -> dict:
             "cnpj_cpf": tax_id,
             "valor_total": valor_total
         }
-    except ValueError:
-        raise
-    except Exception as e:
+    except etree.LxmlError as e:
         raise ValueError(f"Erro ao processar XML: {str(e)}")
 
+def build_parse_xml_response(dados: dict) -> dict:
+    """Monta o JSON plano no formato compatível com NestJS: name, address, taxId"""
+    nome_extraido = dados.get("nome_destinatario")
+    endereco_extraido = dados.get("endereco", {}).get("completo") or ""
+    cnpj_extraido = dados.get("cnpj_cpf")
+    
+    return {
+        "name": nome_extraido,
+        "address": endereco_extraido,
+        "taxId": cnpj_extraido
+    }
+
 @app.post("/nfe/parse-xml")
-async def parse_nfe_xml(request: XMLNFeRequest):
+async def parse_nfe_xml(request: XMLNFeRequest) -> dict:
     """
     Faz parse local do XML da NF-e e extrai dados do destinatário e valor total.
     
@@ -809,27 +706,18 @@ async def parse_nfe_xml(request: XMLNFeRequest):
                 detail="XML não pode estar vazio"
             )
         
-        # Valida se parece com XML
-        if not xml_content.startswith('<?xml') and not xml_content.startswith('<'):
+        # Valida se parece com XML ('<?xml' também começa com '<')
+        if not xml_content.startswith('<'):
             raise HTTPException(
                 status_code=400,
                 detail="Conteúdo fornecido não é um XML válido"
             )
         
         # Extrai os dados do XML usando lxml com namespaces da NF-e
-        dados = extract_nfe_complete_data(xml_content)
-        
-        # Retorna JSON plano com os dados extraídos
-        # Formato compatível com NestJS: name, address, taxId
-        nome_extraido = dados.get("nome_destinatario")
-        endereco_extraido = dados.get("endereco", {}).get("completo") or ""
-        cnpj_extraido = dados.get("cnpj_cpf")
+        # Roda em thread: o lxml libera o GIL no parse e o event loop segue atendendo outras requisições
+        dados = await asyncio.to_thread(extract_nfe_complete_data, xml_content)
         
-        return {
-            "name": nome_extraido,
-            "address": endereco_extraido,
-            "taxId": cnpj_extraido
-        }
+        return build_parse_xml_response(dados)
         
     except HTTPException:
         raise
@@ -844,8 +732,40 @@ async def parse_nfe_xml(request: XMLNFeRequest):
             detail=f"Erro ao processar XML: {str(e)}"
         )
 
+@app.post("/extract-nfe")
+async def extract_nfe_raw(body: bytes = Body(b"", media_type="application/xml")) -> dict:
+    """
+    Mesmo parse de POST /nfe/parse-xml, mas recebendo o XML da NF-e direto no corpo da requisição.
+    
+    Os bytes recebidos são entregues ao lxml sem o envelope JSON e sem decode/encode
+    intermediário, o que evita cópias do documento inteiro em XMLs grandes.
+    
+    - **body**: XML completo da NF-e (Content-Type: application/xml)
+    
+    Retorna o mesmo formato de POST /nfe/parse-xml: name, address, taxId
+    """
+    if not body:
+        raise HTTPException(
+            status_code=400,
+            detail="XML não pode estar vazio"
+        )
+    
+    try:
+        dados = await asyncio.to_thread(extract_nfe_complete_data, body)
+        return build_parse_xml_response(dados)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao processar XML: {str(e)}"
+        )
+
 @app.post("/nfe/extract-from-xml")
-async def extract_nfe_from_xml(request: XMLNFeRequest):
+async def extract_nfe_from_xml(request: XMLNFeRequest) -> dict:
     """
     Extrai dados da NF-e a partir do XML completo fornecido diretamente.
     
@@ -859,40 +779,15 @@ async def extract_nfe_from_xml(request: XMLNFeRequest):
     try:
         xml_content = request.xml.strip()
         
-        # Valida se parece com XML
-        if not xml_content.startswith('<?xml') and not xml_content.startswith('<'):
+        # Valida se parece com XML ('<?xml' também começa com '<')
+        if not xml_content.startswith('<'):
             raise HTTPException(
                 status_code=400,
                 detail="Conteúdo fornecido não parece ser um XML válido"
             )
         
-        # Extrai os dados do XML
-        dados_nfe = extract_nfe_data_from_xml(xml_content)
-        
-        # Tenta extrair a chave de acesso do XML
-        nfe_key = None
-        try:
-            root = etree.fromstring(xml_content.encode('utf-8'))
-            # Busca a chave de acesso
-            chave_elem = root.find('.//{http://www.portalfiscal.inf.br/nfe}chNFe') or root.find('.//chNFe')
-            if chave_elem is None:
-                # Tenta buscar em infNFe
-                inf_nfe = root.find('.//{http://www.portalfiscal.inf.br/nfe}infNFe') or root.find('.//infNFe')
-                if inf_nfe is not None:
-                    chave_elem = inf_nfe.get('Id')
-                    if chave_elem and chave_elem.startswith('NFe'):
-                        nfe_key = chave_elem.replace('NFe', '')
-            else:
-                nfe_key = chave_elem.text.strip() if chave_elem.text else None
-            
-            # Se não encontrou, tenta buscar no Id do infNFe
-            if not nfe_key:
-                for elem in root.iter():
-                    if 'Id' in elem.attrib and elem.attrib['Id'].startswith('NFe'):
-                        nfe_key = elem.attrib['Id'].replace('NFe', '')
-                        break
-        except:
-            pass
+        # Extrai os dados e a chave de acesso do XML (um único parse)
+        dados_nfe, nfe_key = await asyncio.to_thread(extract_nfe_data_and_key, xml_content)
         
         return {
             "success": True,
@@ -908,8 +803,30 @@ async def extract_nfe_from_xml(request: XMLNFeRequest):
             detail=f"Erro ao processar XML: {str(e)}"
         )
 
+async def read_xml_upload(file: UploadFile) -> bytes:
+    """
+    Lê o XML enviado em blocos de XML_READ_CHUNK_SIZE, sem carregar o arquivo de uma vez.
+    
+    Só junta os bytes: o parse é feito depois, em thread, para não ocupar o event loop.
+    Levanta HTTPException 413 acima de MAX_XML_UPLOAD_SIZE.
+    """
+    chunks = []
+    size = 0
+    while True:
+        chunk = await file.read(XML_READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_XML_UPLOAD_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Arquivo XML muito grande. Tamanho máximo: {MAX_XML_UPLOAD_SIZE} bytes."
+            )
+        chunks.append(chunk)
+    return b''.join(chunks)
+
 @app.post("/nfe/extract-from-xml-file")
-async def extract_nfe_from_xml_file(file: UploadFile = File(...)):
+async def extract_nfe_from_xml_file(file: UploadFile = File(...)) -> dict:
     """
     Extrai dados da NF-e a partir de um arquivo XML enviado.
     
@@ -928,37 +845,11 @@ async def extract_nfe_from_xml_file(file: UploadFile = File(...)):
                 detail="Arquivo inválido. Apenas arquivos XML são aceitos."
             )
         
-        # Lê o conteúdo do arquivo
-        xml_content = await file.read()
-        xml_content = xml_content.decode('utf-8').strip()
-        
-        # Extrai os dados do XML
-        dados_nfe = extract_nfe_data_from_xml(xml_content)
+        # Lê o arquivo em blocos e mantém em bytes: o lxml usa o encoding declarado no próprio XML
+        xml_content = await read_xml_upload(file)
         
-        # Tenta extrair a chave de acesso do XML
-        nfe_key = None
-        try:
-            root = etree.fromstring(xml_content.encode('utf-8'))
-            # Busca a chave de acesso
-            chave_elem = root.find('.//{http://www.portalfiscal.inf.br/nfe}chNFe') or root.find('.//chNFe')
-            if chave_elem is None:
-                # Tenta buscar em infNFe
-                inf_nfe = root.find('.//{http://www.portalfiscal.inf.br/nfe}infNFe') or root.find('.//infNFe')
-                if inf_nfe is not None:
-                    chave_elem = inf_nfe.get('Id')
-                    if chave_elem and chave_elem.startswith('NFe'):
-                        nfe_key = chave_elem.replace('NFe', '')
-            else:
-                nfe_key = chave_elem.text.strip() if chave_elem.text else None
-            
-            # Se não encontrou, tenta buscar no Id do infNFe
-            if not nfe_key:
-                for elem in root.iter():
-                    if 'Id' in elem.attrib and elem.attrib['Id'].startswith('NFe'):
-                        nfe_key = elem.attrib['Id'].replace('NFe', '')
-                        break
-        except:
-            pass
+        # Extrai os dados e a chave de acesso em thread (o parse é o trecho pesado)
+        dados_nfe, nfe_key = await asyncio.to_thread(extract_nfe_data_and_key, xml_content.strip())
         
         return {
             "success": True,
@@ -975,53 +866,137 @@ async def extract_nfe_from_xml_file(file: UploadFile = File(...)):
             detail=f"Erro ao processar XML: {str(e)}"
         )
 
+# Corpo JSON de GET /certificate/status, reaproveitado por STATUS_CACHE_TTL segundos enquanto
+# a configuração em memória não muda (consultas frequentes de health-check/UI não refazem a
+# montagem nem a serialização)
+STATUS_CACHE_TTL = 1.0
+_status_cache = {"ts": 0.0, "key": None, "body": None}
+
 @app.get("/certificate/status")
 async def get_certificate_status():
     """Retorna o status atual do certificado configurado"""
-    config = get_certificate_config()
+    now = time.monotonic()
+    cache_key = tuple(certificate_config.values())
+    if (_status_cache["body"] is not None and _status_cache["key"] == cache_key
+            and now - _status_cache["ts"] < STATUS_CACHE_TTL):
+        return Response(content=_status_cache["body"], media_type="application/json")
     
-    cert_path = Path(config["path"])
-    cert_exists = cert_path.exists()
+    config = get_certificate_config()
+    cert_exists = config.exists
     
     # Informações de debug
+    # O caminho já vem absoluto e o certificado do upload só é usado se existir,
+    # então nenhum stat/resolve extra é necessário aqui
     debug_info = {
         "configured": cert_exists,
-        "path": config["path"],
-        "path_absolute": str(cert_path.resolve()) if cert_path else None,
+        "path": config.path,
+        "path_absolute": config.path,
         "path_exists": cert_exists,
-        "uf": config["uf"],
-        "homologacao": config["homologacao"],
+        "uf": config.uf,
+        "homologacao": config.homologacao,
         "source": "upload" if certificate_config["path"] else ".env",
         "upload_config": {
             "path": certificate_config["path"],
-            "path_exists": os.path.exists(certificate_config["path"]) if certificate_config["path"] else False
+            "path_exists": cert_exists and config.path == certificate_config["path"]
         } if certificate_config["path"] else None,
         "certificates_dir": str(CERTIFICATES_DIR.resolve()),
         "certificates_dir_exists": CERTIFICATES_DIR.exists()
     }
     
-    return debug_info
+    _status_cache["body"] = orjson.dumps(debug_info)
+    _status_cache["key"] = cache_key
+    _status_cache["ts"] = now
+    return Response(content=_status_cache["body"], media_type="application/json")
 
 
 @app.delete("/certificate")
-async def delete_certificate():
+async def delete_certificate() -> dict:
     """Remove o certificado enviado (volta para o .env)"""
-    if certificate_config["path"] and os.path.exists(certificate_config["path"]):
-        try:
+    if certificate_config["path"]:
+        # Ignora erro ao remover (ex.: arquivo já apagado)
+        with suppress(OSError):
             os.remove(certificate_config["path"])
-        except Exception as e:
-            pass  # Ignora erro ao remover
     
     certificate_config["path"] = None
     certificate_config["password"] = None
     certificate_config["uf"] = None
     certificate_config["homologacao"] = False
     
+    _cert_cache.clear()
+    clear_comunicacao_cache()
+    _status_cache["body"] = None
+    
     return {"message": "Certificado removido. Sistema voltará a usar configurações do .env"}
 
+def scan_distribution(xml_content: bytes) -> tuple:
+    """
+    Lê a resposta da distribuição DF-e em streaming, em uma única passada, e retorna
+    (cStat, xMotivo ou xMsg, XML do primeiro docZip já decodificado).
+    
+    O parse para no primeiro docZip, sem montar o restante da árvore. O XML é None quando não há docZip
+    ou ele não pode ser decodificado. Levanta XMLSyntaxError se a resposta estiver malformada.
+    """
+    found = {}
+    xml_nfe = None
+    for _, elem in etree.iterparse(io.BytesIO(xml_content), events=('end',), tag=DIST_SCAN_TAGS,
+                                   resolve_entities=False, load_dtd=False, no_network=True):
+        name = local_name(elem.tag)
+        if name == 'docZip':
+            if elem.text:
+                try:
+                    xml_nfe = decode_doczip(elem.text).decode('utf-8')
+                except (ValueError, zlib.error):
+                    # Inválido: o parse completo tenta os demais docZip
+                    pass
+            break
+        field = STATUS_TAGS[name]
+        if field not in found and elem.text:
+            found[field] = elem.text.strip()
+    return found.get('cStat'), found.get('xMotivo') or found.get('xMsg'), xml_nfe
+
+def extract_xml_nfe(root, xml_content: bytes):
+    """
+    Localiza o XML da NF-e em uma resposta da distribuição DF-e, retornando no primeiro que encontrar:
+    docZip (base64 + gzip), elemento NFe completo, nfeProc e, por fim, a resposta inteira.
+    
+    O docZip e a resposta inteira são retornados como texto; NFe e nfeProc, que já estão
+    na árvore, são retornados como elemento para serem lidos sem um novo parse.
+    Com root None, faz antes o parse de xml_content, para que parse e descompactação
+    rodem juntos na mesma chamada em thread.
+    """
+    if root is None:
+        root = parse_nfe(xml_content)
+    
+    # PRIORIDADE 1: docZip com o XML completo compactado; usa o primeiro que puder ser decodificado
+    for doc_zip_text in XP_DOCZIP(root) or XP_DOCZIP_ANY(root):
+        try:
+            return decode_doczip(doc_zip_text).decode('utf-8')
+        except (ValueError, zlib.error):
+            # base64, gzip ou UTF-8 inválidos: tenta o próximo docZip
+            continue
+    
+    # PRIORIDADE 2: XML da NF-e já descompactado na resposta
+    nfe_elements = (
+        XP_NFE(root) or
+        XP_NFE_ANY(root) or
+        # Só o primeiro elemento é usado: para no primeiro que casar
+        list(islice((elem for elem in root.iter(etree.Element) if 'NFe' in elem.tag), 1))
+    )
+    if nfe_elements:
+        nfe = nfe_elements[0]
+        # Usa o NFe se tiver a estrutura esperada (infNFe e dest); senão tenta o nfeProc completo
+        if nfe.find('.//{*}infNFe') is not None and nfe.find('.//{*}dest') is not None:
+            return nfe
+        nfe_proc = XP_NFE_PROC(root)
+        if nfe_proc:
+            return nfe_proc[0]
+    
+    # Não encontrou nada: usa o XML completo da resposta
+    return xml_content.decode('utf-8', 'replace')
+
 
 @app.get("/nfe/{nfe_key}")
-async def get_nfe_data(nfe_key: str):
+async def get_nfe_data(nfe_key: str) -> dict:
     """
     Consulta NF-e pela chave de acesso via SEFAZ.
     
@@ -1031,7 +1006,7 @@ async def get_nfe_data(nfe_key: str):
     Para processar XMLs já armazenados, use POST /nfe/parse-xml
     """
     # Remove espaços e caracteres não numéricos
-    nfe_key_clean = ''.join(filter(str.isdigit, nfe_key))
+    nfe_key_clean = digits_only(nfe_key)
     
     # Valida comprimento: NF-e tem 44 dígitos, NFS-e pode ter formatos diferentes (geralmente 50-56)
     if len(nfe_key_clean) == 44:
@@ -1069,7 +1044,7 @@ async def get_nfe_data(nfe_key: str):
     cert_config = get_certificate_config()
     
     # Verifica se há certificado configurado
-    if not cert_config["path"] or not Path(cert_config["path"]).exists():
+    if not cert_config.path or not cert_config.exists:
         raise HTTPException(
             status_code=404,
             detail="Certificado não configurado ou não encontrado. "
@@ -1079,121 +1054,42 @@ async def get_nfe_data(nfe_key: str):
     
     # Se a UF da chave for diferente da configurada, usa a UF da chave
     # Isso permite consultar notas de qualquer estado
-    if uf_da_chave and uf_da_chave != cert_config["uf"]:
-        # Avisa que está usando a UF da chave, não a do certificado
-        # Nota: O certificado precisa ter permissão para consultar notas de outros estados
-        cert_config["uf"] = uf_da_chave
-
-    # Verifica se o certificado existe
-    if not os.path.exists(cert_config["path"]):
-        raise HTTPException(
-            status_code=500,
-            detail=f"Certificado não encontrado em: {cert_config['path']}. Faça upload de um certificado ou configure o .env"
-        )
+    # Nota: O certificado precisa ter permissão para consultar notas de outros estados
+    uf_consulta = uf_da_chave or cert_config.uf
 
     try:
         # Inicializa a comunicação com a SEFAZ
         # Isso também testa se o certificado pode ser aberto com a senha fornecida
-        con = ComunicacaoSefaz(
-            cert_config["uf"], 
-            cert_config["path"], 
-            cert_config["password"], 
-            homologacao=cert_config["homologacao"]
+        con = get_comunicacao(
+            cert_config.path,
+            cert_config.password,
+            uf_consulta,
+            cert_config.homologacao
         )
         
         # Método correto: consulta_nota (não consultar_nota)
         # Este método consulta a situação da NF-e pela chave de acesso
         # Modelo: "nfe" para NF-e (modelo 55) ou "nfce" para NFC-e (modelo 65)
         try:
-            resposta = con.consulta_nota(chave=nfe_key, modelo='nfe')
+            resposta = await asyncio.to_thread(con.consulta_nota, chave=nfe_key, modelo='nfe')
             
             # Verifica se a resposta é válida
             if resposta is None:
                 raise Exception("Resposta da consulta retornou None")
             
-            # Armazena o XML da resposta para possível extração de dados
-            xml_resposta_consulta = None
-            
             # Se a resposta é um objeto Response do requests, precisa processar o XML
             if isinstance(resposta, requests.Response):
-                # Extrai o conteúdo XML da resposta
-                xml_content = resposta.text
-                xml_resposta_consulta = xml_content  # Guarda para possível uso posterior
+                # Extrai o conteúdo XML da resposta em bytes: o parser decodifica conforme a
+                # declaração do próprio XML, sem decodificar a resposta inteira para str antes
+                xml_content = resposta.content
                 if not xml_content:
                     raise Exception("Resposta HTTP não contém conteúdo XML")
                 
-                # Faz o parsing do XML
-                try:
-                    root = etree.fromstring(xml_content.encode('utf-8'))
-                except Exception as parse_error:
-                    # Tenta sem encoding se falhar
-                    root = etree.fromstring(xml_content)
-                
-                # Namespaces comuns da SEFAZ
-                namespaces = {
-                    'nfe': 'http://www.portalfiscal.inf.br/nfe',
-                    'soap': 'http://schemas.xmlsoap.org/soap/envelope/',
-                    'soap12': 'http://www.w3.org/2003/05/soap-envelope'
-                }
-                
-                # Tenta encontrar cStat e xMotivo no XML
-                status_code = None
-                motivo = None
-                
-                # Busca cStat em diferentes namespaces e locais
-                search_paths = [
-                    './/cStat',
-                    './/cstat',
-                    './/{http://www.portalfiscal.inf.br/nfe}cStat',
-                    './/{http://www.portalfiscal.inf.br/nfe}cstat',
-                    './/soap:Body//cStat',
-                    './/soap12:Body//cStat',
-                    './/retConsSitNFe//cStat',
-                    './/retConsSitNFe//cstat',
-                ]
-                
-                for path in search_paths:
-                    try:
-                        elem = root.find(path, namespaces=namespaces) if ':' in path or '{' in path else root.find(path)
-                        if elem is not None and elem.text:
-                            status_code = elem.text.strip()
-                            break
-                    except:
-                        continue
+                # Faz o parsing do XML (em thread, fora do event loop)
+                root = await asyncio.to_thread(parse_nfe, xml_content)
                 
-                # Busca xMotivo em diferentes namespaces e locais
-                motivo_paths = [
-                    './/xMotivo',
-                    './/xmotivo',
-                    './/xMsg',
-                    './/{http://www.portalfiscal.inf.br/nfe}xMotivo',
-                    './/{http://www.portalfiscal.inf.br/nfe}xmotivo',
-                    './/soap:Body//xMotivo',
-                    './/soap12:Body//xMotivo',
-                    './/retConsSitNFe//xMotivo',
-                    './/retConsSitNFe//xmotivo',
-                ]
-                
-                for path in motivo_paths:
-                    try:
-                        elem = root.find(path, namespaces=namespaces) if ':' in path or '{' in path else root.find(path)
-                        if elem is not None and elem.text:
-                            motivo = elem.text.strip()
-                            break
-                    except:
-                        continue
-                
-                # Se ainda não encontrou, tenta buscar todos os elementos e procurar manualmente
-                if status_code is None or motivo is None:
-                    all_elements = root.iter()
-                    for elem in all_elements:
-                        tag_name = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                        if tag_name.lower() in ['cstat', 'c_stat'] and elem.text:
-                            status_code = elem.text.strip()
-                        if tag_name.lower() in ['xmotivo', 'x_motivo', 'xmsg'] and elem.text:
-                            motivo = elem.text.strip()
-                        if status_code and motivo:
-                            break
+                # Busca cStat e xMotivo em uma única passada pela árvore (ignora namespace)
+                status_code, motivo = find_status(root)
                 
             else:
                 # Se não é Response, tenta acessar como objeto normal
@@ -1206,25 +1102,11 @@ async def get_nfe_data(nfe_key: str):
             if motivo is None:
                 motivo = getattr(resposta, 'xMotivo', None) or getattr(resposta, 'motivo', None) or 'Consulta realizada'
             
-            # Se ainda não encontrou, tenta extrair do XML diretamente como string
+            # Se ainda não encontrou, retorna erro com parte do XML para debug
+            # (a busca na árvore já cobre cStat em qualquer namespace, não há o que procurar no texto)
             if status_code is None:
-                # Última tentativa: busca no texto do XML
-                if isinstance(resposta, requests.Response):
-                    xml_text = resposta.text
-                    import re
-                    # Busca padrões como <cStat>100</cStat> ou cStat="100"
-                    cstat_match = re.search(r'<cStat[^>]*>(\d+)</cStat>', xml_text, re.IGNORECASE)
-                    if cstat_match:
-                        status_code = cstat_match.group(1)
-                    
-                    xmotivo_match = re.search(r'<xMotivo[^>]*>(.*?)</xMotivo>', xml_text, re.IGNORECASE | re.DOTALL)
-                    if xmotivo_match and not motivo:
-                        motivo = xmotivo_match.group(1).strip()
-                
-                # Se ainda não encontrou, retorna erro com parte do XML para debug
-                if status_code is None:
-                    xml_preview = resposta.text[:500] if isinstance(resposta, requests.Response) else str(resposta)[:500]
-                    raise Exception(f"Resposta não contém status. XML preview: {xml_preview}")
+                xml_preview = resposta.content[:500].decode('utf-8', 'replace') if isinstance(resposta, requests.Response) else str(resposta)[:500]
+                raise Exception(f"Resposta não contém status. XML preview: {xml_preview}")
             
             # Se a nota foi encontrada (status 100 = autorizada)
             if str(status_code) == '100':
@@ -1236,58 +1118,28 @@ async def get_nfe_data(nfe_key: str):
                     # Extrai CNPJ da chave de acesso (posições 6 a 19)
                     cnpj_chave = nfe_key[6:20]
                     
-                    resposta_dist = con.consulta_distribuicao(
+                    resposta_dist = await asyncio.to_thread(
+                        con.consulta_distribuicao,
                         cnpj=cnpj_chave,
                         chave=nfe_key
                     )
                     
                     # Processa o XML se disponível
                     if isinstance(resposta_dist, requests.Response):
-                        xml_content = resposta_dist.text
+                        xml_content = resposta_dist.content
+                        
                         if xml_content:
                             try:
-                                root = etree.fromstring(xml_content.encode('utf-8'))
-                                
-                                # Namespaces para busca
-                                ns = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
-                                
-                                # Verifica o status da distribuição DF-e primeiro
-                                dist_status = None
-                                dist_motivo = None
-                                
-                                # Busca o status da distribuição
-                                status_paths = [
-                                    './/cStat',
-                                    './/{http://www.portalfiscal.inf.br/nfe}cStat',
-                                    './/retDistDFeInt//cStat',
-                                    './/loteDistDFeInt//cStat'
-                                ]
-                                
-                                for path in status_paths:
-                                    try:
-                                        elem = root.find(path, namespaces=ns) if ':' in path or '{' in path else root.find(path)
-                                        if elem is not None and elem.text:
-                                            dist_status = elem.text.strip()
-                                            break
-                                    except:
-                                        continue
-                                
-                                # Busca o motivo
-                                motivo_paths = [
-                                    './/xMotivo',
-                                    './/{http://www.portalfiscal.inf.br/nfe}xMotivo',
-                                    './/retDistDFeInt//xMotivo',
-                                    './/loteDistDFeInt//xMotivo'
-                                ]
-                                
-                                for path in motivo_paths:
-                                    try:
-                                        elem = root.find(path, namespaces=ns) if ':' in path or '{' in path else root.find(path)
-                                        if elem is not None and elem.text:
-                                            dist_motivo = elem.text.strip()
-                                            break
-                                    except:
-                                        continue
+                                # Status, motivo e o primeiro docZip em uma única passada, em streaming:
+                                # a árvore completa só é montada se não houver docZip utilizável
+                                # Parse e descompactação rodam em thread, sem travar o event loop
+                                root = None
+                                try:
+                                    dist_status, dist_motivo, xml_nfe = await asyncio.to_thread(scan_distribution, xml_content)
+                                except etree.XMLSyntaxError:
+                                    # Resposta malformada: recorre ao parser tolerante a erros
+                                    root = await asyncio.to_thread(parse_nfe, xml_content)
+                                    dist_status, dist_motivo = find_status(root)
                                 
                                 # Se a distribuição retornou erro, tenta fazer manifestação do destinatário
                                 if dist_status and dist_status != '138':  # 138 = Documento localizado
@@ -1310,7 +1162,8 @@ async def get_nfe_data(nfe_key: str):
                                                 try:
                                                     # Tenta fazer a manifestação
                                                     # Parâmetros podem variar conforme a biblioteca
-                                                    resultado_manifestacao = con.evento(
+                                                    resultado_manifestacao = await asyncio.to_thread(
+                                                        con.evento,
                                                         cnpj=cnpj_cpf_chave,
                                                         chave=nfe_key,
                                                         tipo_evento='210200'  # Ciência da Operação
@@ -1320,29 +1173,29 @@ async def get_nfe_data(nfe_key: str):
                                                     if resultado_manifestacao:
                                                         manifestacao_feita = True
                                                         # Aguarda um pouco antes de tentar novamente
-                                                        import time
-                                                        time.sleep(2)
+                                                        await asyncio.sleep(2)
                                                         
                                                         # Tenta consultar a distribuição novamente
-                                                        resposta_dist_retry = con.consulta_distribuicao(
+                                                        resposta_dist_retry = await asyncio.to_thread(
+                                                            con.consulta_distribuicao,
                                                             cnpj=cnpj_cpf_chave,
                                                             chave=nfe_key
                                                         )
                                                         
                                                         if isinstance(resposta_dist_retry, requests.Response):
-                                                            xml_content_retry = resposta_dist_retry.text
+                                                            xml_content_retry = resposta_dist_retry.content
                                                             if xml_content_retry:
-                                                                root_retry = etree.fromstring(xml_content_retry.encode('utf-8'))
+                                                                root_retry = await asyncio.to_thread(parse_nfe, xml_content_retry)
                                                                 # Verifica se agora tem docZip
-                                                                doc_zip_retry = root_retry.find('.//docZip') or root_retry.find('.//{http://www.portalfiscal.inf.br/nfe}docZip')
-                                                                if doc_zip_retry is not None and doc_zip_retry.text:
+                                                                if XP_DOCZIP(root_retry) or XP_DOCZIP_ANY(root_retry):
                                                                     # Se encontrou docZip, processa normalmente
                                                                     xml_content = xml_content_retry
                                                                     root = root_retry
                                                                     dist_status = '138'  # Marca como sucesso para processar
                                                                     dist_motivo = "Manifestação realizada com sucesso"
-                                                except Exception as manifest_error:
-                                                    # Se a manifestação falhar, continua com o erro original
+                                                except Exception:
+                                                    # Se a manifestação falhar (rede, SEFAZ ou assinatura do evento no pynfe),
+                                                    # continua com o erro original
                                                     pass
                                             
                                             if not manifestacao_feita:
@@ -1357,164 +1210,18 @@ async def get_nfe_data(nfe_key: str):
                                     else:
                                         xml_error_msg = f"Distribuição DF-e retornou status {dist_status}: {dist_motivo or 'Erro desconhecido'}. O XML completo não está disponível via distribuição DF-e."
                                         xml_nfe = None
-                                else:
-                                    # PRIORIDADE 1: Procura pela tag docZip (XML completo compactado)
-                                    # A distribuição DF-e retorna o XML completo dentro de docZip em base64 + gzip
-                                    doc_zip_found = False
                                 
-                                # Tenta usar xpath primeiro (mais eficiente)
-                                try:
-                                    # Namespace para distribuição DF-e
-                                    ns_dist = {'ns': 'http://www.portalfiscal.inf.br/nfe'}
-                                    doc_zip_nodes = root.xpath('//ns:docZip/text()', namespaces=ns_dist)
-                                    
-                                    if not doc_zip_nodes:
-                                        # Tenta sem namespace
-                                        doc_zip_nodes = root.xpath('//docZip/text()')
-                                    
-                                    if doc_zip_nodes and doc_zip_nodes[0]:
-                                        doc_zip_text = doc_zip_nodes[0].strip()
-                                        try:
-                                            # XML está em base64 e compactado com gzip
-                                            xml_compressed = base64.b64decode(doc_zip_text)
-                                            xml_nfe = gzip.decompress(xml_compressed).decode('utf-8')
-                                            
-                                            # Garante que o XML tem a declaração XML
-                                            if not xml_nfe.strip().startswith('<?xml'):
-                                                xml_nfe = '<?xml version="1.0" encoding="UTF-8"?>' + xml_nfe
-                                            
-                                            doc_zip_found = True
-                                        except Exception as decompress_error:
-                                            # Tenta sem descompactar (pode já estar descompactado)
-                                            try:
-                                                xml_nfe = base64.b64decode(doc_zip_text).decode('utf-8')
-                                                if not xml_nfe.strip().startswith('<?xml'):
-                                                    xml_nfe = '<?xml version="1.0" encoding="UTF-8"?>' + xml_nfe
-                                                doc_zip_found = True
-                                            except:
-                                                pass
-                                except:
-                                    pass
+                                # Distribuição localizou a nota (ou a manifestação a liberou) mas o docZip não foi
+                                # lido na passada única: extrai o XML da NF-e da árvore completa
+                                # (parse, quando ainda não feito, e descompactação em uma única chamada em thread)
+                                if (not dist_status or dist_status == '138') and xml_nfe is None:
+                                    xml_nfe = await asyncio.to_thread(extract_xml_nfe, root, xml_content)
                                 
-                                # Se xpath não funcionou, tenta com find
-                                if not doc_zip_found:
-                                    # Tenta diferentes caminhos para encontrar docZip
-                                    doc_zip_paths = [
-                                        './/docZip',
-                                        './/{http://www.portalfiscal.inf.br/nfe}docZip',
-                                        './/loteDistDFeInt//docZip',
-                                        './/retDistDFeInt//docZip',
-                                        './/retDistDFeInt//loteDistDFeInt//docZip'
-                                    ]
-                                    
-                                    for doc_zip_path in doc_zip_paths:
-                                        try:
-                                            # Tenta encontrar com namespace
-                                            doc_zip = root.find(doc_zip_path, namespaces=ns)
-                                            if doc_zip is None:
-                                                # Tenta sem namespace explícito
-                                                doc_zip = root.find(doc_zip_path.replace('{http://www.portalfiscal.inf.br/nfe}', ''))
-                                            
-                                            if doc_zip is not None and doc_zip.text:
-                                                try:
-                                                    # XML está em base64 e compactado com gzip
-                                                    xml_compressed = base64.b64decode(doc_zip.text.strip())
-                                                    xml_nfe = gzip.decompress(xml_compressed).decode('utf-8')
-                                                    
-                                                    # Garante que o XML tem a declaração XML
-                                                    if not xml_nfe.strip().startswith('<?xml'):
-                                                        xml_nfe = '<?xml version="1.0" encoding="UTF-8"?>' + xml_nfe
-                                                    
-                                                    doc_zip_found = True
-                                                    break  # Se conseguiu, para de procurar
-                                                except Exception as decompress_error:
-                                                    # Tenta sem descompactar (pode já estar descompactado)
-                                                    try:
-                                                        xml_nfe = base64.b64decode(doc_zip.text.strip()).decode('utf-8')
-                                                        if not xml_nfe.strip().startswith('<?xml'):
-                                                            xml_nfe = '<?xml version="1.0" encoding="UTF-8"?>' + xml_nfe
-                                                        doc_zip_found = True
-                                                        break
-                                                    except:
-                                                        continue
-                                        except:
-                                            continue
-                                    
-                                    # Última tentativa: busca por iteração
-                                    if not doc_zip_found:
-                                        for elem in root.iter():
-                                            tag_local = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                                            if tag_local == 'docZip' and elem.text and len(elem.text.strip()) > 100:
-                                                try:
-                                                    xml_compressed = base64.b64decode(elem.text.strip())
-                                                    xml_nfe = gzip.decompress(xml_compressed).decode('utf-8')
-                                                    if not xml_nfe.strip().startswith('<?xml'):
-                                                        xml_nfe = '<?xml version="1.0" encoding="UTF-8"?>' + xml_nfe
-                                                    doc_zip_found = True
-                                                    break
-                                                except:
-                                                    try:
-                                                        xml_nfe = base64.b64decode(elem.text.strip()).decode('utf-8')
-                                                        if not xml_nfe.strip().startswith('<?xml'):
-                                                            xml_nfe = '<?xml version="1.0" encoding="UTF-8"?>' + xml_nfe
-                                                        doc_zip_found = True
-                                                        break
-                                                    except:
-                                                        continue
-                                
-                                # PRIORIDADE 2: Se não encontrou docZip, tenta buscar XML direto (caso já esteja descompactado)
-                                if not doc_zip_found:
-                                    # Procura pelo XML da NF-e em diferentes formatos
-                                    nfe_elements = (
-                                        root.findall('.//NFe', namespaces=ns) or
-                                        root.findall('.//{http://www.portalfiscal.inf.br/nfe}NFe') or
-                                        root.findall('.//NFe') or
-                                        [elem for elem in root.iter() if 'NFe' in elem.tag]
-                                    )
-                                    
-                                    if nfe_elements:
-                                        # Pega o elemento NFe completo
-                                        nfe_root = nfe_elements[0]
-                                        # Converte o elemento NFe completo para string XML
-                                        xml_nfe = etree.tostring(nfe_root, encoding='unicode', pretty_print=False)
-                                        
-                                        # Verifica se o XML contém a estrutura esperada (infNFe e dest)
-                                        if '<infNFe' not in xml_nfe or '<dest' not in xml_nfe:
-                                            # Se não tem infNFe ou dest, tenta pegar o nfeProc completo
-                                            nfe_proc = root.find('.//nfeProc', namespaces=ns) or root.find('.//{http://www.portalfiscal.inf.br/nfe}nfeProc')
-                                            if nfe_proc is not None:
-                                                xml_nfe = etree.tostring(nfe_proc, encoding='unicode', pretty_print=False)
-                                            else:
-                                                # Tenta pegar o XML completo da resposta
-                                                xml_nfe = xml_content
-                                    
-                                    # Se ainda não encontrou, procura por qualquer elemento com XML em base64
-                                    if not xml_nfe:
-                                        for elem in root.iter():
-                                            tag_local = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                                            if tag_local == 'docZip' and elem.text and len(elem.text) > 100:
-                                                try:
-                                                    decoded = base64.b64decode(elem.text.strip())
-                                                    try:
-                                                        xml_nfe = gzip.decompress(decoded).decode('utf-8')
-                                                    except:
-                                                        xml_nfe = decoded.decode('utf-8')
-                                                    if xml_nfe and '<NFe' in xml_nfe:
-                                                        if not xml_nfe.strip().startswith('<?xml'):
-                                                            xml_nfe = '<?xml version="1.0" encoding="UTF-8"?>' + xml_nfe
-                                                        break
-                                                except:
-                                                    continue
-                                    
-                                    # Se ainda não encontrou nada, usa o XML completo da resposta
-                                    if not xml_nfe:
-                                        xml_nfe = xml_content
-                                
-                            except Exception as parse_error:
+                            except (etree.LxmlError, ValueError) as parse_error:
                                 xml_error_msg = f"Erro ao parsear XML: {str(parse_error)}"
                     
                     # Tenta acessar como objeto normal (se não for Response)
-                    if not xml_nfe and resposta_dist and not isinstance(resposta_dist, requests.Response):
+                    if xml_nfe is None and resposta_dist and not isinstance(resposta_dist, requests.Response):
                         if hasattr(resposta_dist, 'listaNFe') and resposta_dist.listaNFe:
                             if len(resposta_dist.listaNFe) > 0:
                                 xml_nfe = getattr(resposta_dist.listaNFe[0], 'xml', None)
@@ -1522,64 +1229,53 @@ async def get_nfe_data(nfe_key: str):
                             xml_nfe = resposta_dist.xml
                     
                     # Se conseguiu o XML, extrai os dados
-                    if xml_nfe:
+                    dados_nfe = None
+                    if isinstance(xml_nfe, etree._Element):
+                        # NFe/nfeProc da própria resposta: os campos são lidos direto da árvore, sem novo parse
+                        dados_nfe = extract_nfe_data_from_element(xml_nfe)
+                    elif xml_nfe:
                         # Garante que o XML está como string
                         if not isinstance(xml_nfe, str):
                             xml_nfe = str(xml_nfe)
                         
-                        # Remove espaços em branco no início/fim
-                        xml_nfe = xml_nfe.strip()
-                        
-                        # Verifica se o XML contém a estrutura básica esperada
-                        # Se não tem a declaração XML, adiciona
-                        if not xml_nfe.startswith('<?xml'):
-                            # Verifica se tem pelo menos um elemento raiz
-                            if xml_nfe.startswith('<'):
-                                xml_nfe = '<?xml version="1.0" encoding="UTF-8"?>' + xml_nfe
-                        
-                        # Debug temporário: verifica o que está no XML
-                        debug_info = {
-                            'xml_length': len(xml_nfe),
-                            'has_docZip': 'docZip' in xml_content if 'xml_content' in locals() else False,
-                            'has_dest': '<dest' in xml_nfe or 'dest' in xml_nfe,
-                            'has_infNFe': '<infNFe' in xml_nfe or 'infNFe' in xml_nfe,
-                            'has_xNome': '<xNome' in xml_nfe or 'xNome' in xml_nfe,
-                            'xml_preview': xml_nfe[:500] if len(xml_nfe) > 500 else xml_nfe
-                        }
-                        
-                        # Chama a função de extração
-                        dados_nfe = extract_nfe_data_from_xml(xml_nfe)
+                        # Remove só os espaços do início (o lxml aceita os do fim): a quebra de linha final
+                        # comum no XML do docZip não gera cópia, pois o lstrip() devolve a mesma string
+                        # Não é preciso acrescentar a declaração XML: o texto é passado ao lxml como UTF-8,
+                        # que já é o encoding assumido sem ela, e a concatenação copiaria o documento inteiro
+                        xml_nfe = xml_nfe.lstrip()
                         
+                        # Chama a função de extração (em thread: o parse da NF-e completa é o trecho mais pesado)
+                        dados_nfe = await asyncio.to_thread(extract_nfe_data_from_xml, xml_nfe)
+                    
+                    if dados_nfe is not None:
                         # Adiciona debug se não encontrou dados
                         if not dados_nfe.get('customer_name') or dados_nfe.get('customer_name') == "Nome não encontrado no XML":
-                            dados_nfe['_debug'] = debug_info
+                            if isinstance(xml_nfe, etree._Element):
+                                # O texto do elemento só é preciso para o debug
+                                xml_nfe = etree.tostring(xml_nfe, encoding='unicode')
+                            
+                            # Debug temporário: verifica o que está no XML
+                            # (uma busca por marcador: 'dest' já cobre '<dest', e assim por diante)
+                            dados_nfe['_debug'] = {
+                                'xml_length': len(xml_nfe),
+                                'has_docZip': b'docZip' in xml_content if 'xml_content' in locals() else False,
+                                'has_dest': 'dest' in xml_nfe,
+                                'has_infNFe': 'infNFe' in xml_nfe,
+                                'has_xNome': 'xNome' in xml_nfe,
+                                'xml_preview': xml_nfe[:500]
+                            }
                         return {
                             "status": str(status_code),
                             "motivo": str(motivo) if motivo else "Nota autorizada",
                             "nfe_key": nfe_key,
                             "uf_detectada": uf_da_chave,
-                            "uf_usada": cert_config["uf"],
+                            "uf_usada": uf_consulta,
                             "xml_available": True,
                             **dados_nfe
                         }
                 except Exception as xml_error:
                     xml_error_msg = str(xml_error)
                 
-                # Última tentativa: tenta extrair dados básicos do XML da resposta da consulta
-                dados_basicos = {}
-                if xml_resposta_consulta:
-                    try:
-                        root_consulta = etree.fromstring(xml_resposta_consulta.encode('utf-8'))
-                        # Tenta extrair informações básicas que podem estar na resposta
-                        # Algumas respostas de consulta podem ter dados do protocolo
-                        for elem in root_consulta.iter():
-                            tag = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                            # Procura por informações úteis na resposta
-                            if tag.lower() in ['cnpj', 'cpf'] and elem.text and len(elem.text.strip()) >= 11:
-                                dados_basicos['tax_id'] = elem.text.strip()
-                    except:
-                        pass
-                
                 # Se não conseguiu extrair XML, retorna erro indicando que a nota precisa ser carregada no storage
                 error_message = "Nota autorizada (status 100), mas o XML completo não está disponível via SEFAZ. "
                 
@@ -1608,7 +1304,8 @@ async def get_nfe_data(nfe_key: str):
                 # Extrai CNPJ da chave de acesso (posições 6 a 19)
                 cnpj_chave = nfe_key[6:20]
                 
-                resposta_dist = con.consulta_distribuicao(
+                resposta_dist = await asyncio.to_thread(
+                    con.consulta_distribuicao,
                     cnpj=cnpj_chave,
                     chave=nfe_key
                 )
@@ -1617,17 +1314,18 @@ async def get_nfe_data(nfe_key: str):
                 
                 # Se a resposta é um objeto Response do requests, processa o XML
                 if isinstance(resposta_dist, requests.Response):
-                    xml_content = resposta_dist.text
+                    xml_content = resposta_dist.content
                     if xml_content:
-                        # Tenta fazer parsing do XML para encontrar a nota
-                        root = etree.fromstring(xml_content.encode('utf-8'))
+                        # Tenta fazer parsing do XML para encontrar a nota (em thread, fora do event loop)
+                        root = await asyncio.to_thread(parse_nfe, xml_content)
                         # Procura por elementos de NF-e no XML
-                        nfe_elements = root.findall('.//NFe') or root.findall('.//nfe:NFe', namespaces={'nfe': 'http://www.portalfiscal.inf.br/nfe'})
+                        # (o elemento é lido direto da árvore, sem serializar e parsear de novo)
+                        nfe_elements = XP_NFE(root) or XP_NFE_ANY(root)
                         if nfe_elements:
-                            xml_nfe = etree.tostring(nfe_elements[0], encoding='unicode')
+                            xml_nfe = nfe_elements[0]
                 
                 # Tenta acessar como objeto normal
-                if not xml_nfe and resposta_dist:
+                if xml_nfe is None and resposta_dist:
                     if hasattr(resposta_dist, 'listaNFe') and resposta_dist.listaNFe:
                         if len(resposta_dist.listaNFe) > 0:
                             xml_nfe = resposta_dist.listaNFe[0].xml
@@ -1635,14 +1333,18 @@ async def get_nfe_data(nfe_key: str):
                         xml_nfe = resposta_dist.xml
                 
                 # Se encontrou o XML, extrai os dados
-                if xml_nfe:
-                    dados_nfe = extract_nfe_data_from_xml(xml_nfe)
+                dados_nfe = None
+                if isinstance(xml_nfe, etree._Element):
+                    dados_nfe = extract_nfe_data_from_element(xml_nfe)
+                elif xml_nfe:
+                    dados_nfe = await asyncio.to_thread(extract_nfe_data_from_xml, xml_nfe)
+                if dados_nfe is not None:
                     return {
                         "status": "100",
                         "motivo": "Nota encontrada na distribuição DF-e",
                         "nfe_key": nfe_key,
                         "uf_detectada": uf_da_chave,
-                        "uf_usada": cert_config["uf"],
+                        "uf_usada": uf_consulta,
                         "xml_available": True,
                         **dados_nfe
                     }
@@ -1660,7 +1362,7 @@ async def get_nfe_data(nfe_key: str):
         # Certificado não encontrado
         raise HTTPException(
             status_code=500,
-            detail=f"Certificado não encontrado: {cert_config['path']}. Verifique se o arquivo está na pasta do projeto."
+            detail=f"Certificado não encontrado: {cert_config.path}. Verifique se o arquivo está na pasta do projeto."
         )
     except Exception as e:
         # Erro ao abrir certificado ou consultar SEFAZ
@@ -1684,4 +1386,10 @@ async def get_nfe_data(nfe_key: str):
 
 if __name__ == "__main__":
     # Rodando no localhost na porta 8000
-    uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
+    # uvloop e httptools são usados automaticamente quando instalados (uvicorn[standard])
+    if WORKERS > 1:
+        # Cada processo tem sua própria memória: um certificado enviado via upload só vale
+        # no processo que recebeu a requisição, então com vários processos use o .env
+        uvicorn.run("main:app", host="127.0.0.1", port=8000, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file